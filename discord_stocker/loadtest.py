@@ -0,0 +1,470 @@
+"""CommandTree に登録されたコマンドを同時多発的に叩く負荷試験ハーネス。
+
+Discord ゲートウェイの代わりに偽の Interaction を生成し、kabutan / yfinance は
+ローカルの偽上流に差し替えて、何件の同時インタラクションまで 3 秒の応答期限
+（defer または send_message）を守れるかを計測する。
+
+使い方（discord_stocker ディレクトリで実行）:
+
+    python loadtest.py --rates 10,25,50,100 --duration 10
+    python loadtest.py --database-url postgresql://localhost/stocker_loadtest
+
+--database-url を明示した場合のみ set / show / sell も負荷対象に含める。
+環境変数 DATABASE_URL は本番 DB を指しうるので参照しない。接続先は引数解析時に
+host / hostaddr / service（と libpq が補う PG* 環境変数）で、さらに実行前に
+inet_server_addr() で確認し、ループバック以外は --allow-remote-db を付けない限り
+拒否する。負荷試験の行は実在しえない負の guild_id に書き込む。
+
+DB モードでは各ユーザーを --guilds 個のサーバーに振り分け、set / sell の銘柄は
+先頭 --portfolio-tickers 件に限定する。show は保有銘柄ごとに同期 I/O を行うため、
+1 サーバーに何百銘柄も溜まる非現実的なポートフォリオだと投入レートと無関係に
+期限超過するのを避けるため。
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import math
+import os
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+import main
+
+ACK_DEADLINE = 3.0
+# Discord の snowflake は正の値なので、負の guild_id なら実データと衝突しない
+LOADTEST_GUILD_BASE = -(2 ** 62)
+LOCAL_DB_HOSTS = {"localhost", "127.0.0.1", "::1"}
+BASE_COMMANDS = ["about", "alert_above", "alert_below", "cancel", "price"]
+DB_COMMANDS = ["set", "show", "sell"]
+
+
+# ---------------------------------------------------------------------------
+# 偽上流（kabutan / yfinance）
+# ---------------------------------------------------------------------------
+
+KABUTAN_PAGE = """<html><head><meta charset="utf-8"></head><body>
+<div>
+  <div></div><div></div>
+  <div>
+    <div>
+      <div></div><div></div><div></div>
+      <div>
+        <div></div><div></div><div></div>
+        <div>
+          <h3>{code} テスト株式会社</h3>
+          <table><tbody>
+            <tr><td>{code}</td></tr>
+            <tr><td><a href="https://example.com/{code}">https://example.com/{code}</a></td></tr>
+            <tr><td>負荷試験用のダミー事業概要</td></tr>
+          </tbody></table>
+        </div>
+      </div>
+    </div>
+  </div>
+</div>
+</body></html>"""
+
+
+def start_fake_kabutan(latency: float) -> ThreadingHTTPServer:
+    """get_company_info の XPath に合う HTML を返すローカル HTTP サーバを起動"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            code = parse_qs(urlparse(self.path).query).get("code", [""])[0]
+            time.sleep(latency)
+            body = KABUTAN_PAGE.format(code=code).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeTicker:
+    """yf.Ticker の代替。本物と同じく同期的にブロックする"""
+
+    latency = 0.0
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+
+    def history(self, period: str = "1d") -> pd.DataFrame:
+        time.sleep(self.latency)
+        base = 1000.0 + (sum(map(ord, self.ticker)) % 500)
+        days = 5 if period == "5d" else 1
+        return pd.DataFrame({"Close": [base + i for i in range(days)]})
+
+
+# ---------------------------------------------------------------------------
+# 偽ゲートウェイ（Interaction）
+# ---------------------------------------------------------------------------
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, *, thinking: bool = False, ephemeral: bool = False):
+        await self._interaction.ack(deferred=True)
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        await self._interaction.ack(deferred=False)
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        await asyncio.sleep(self._interaction.discord_latency)
+        self._interaction.followup_at = time.perf_counter()
+
+
+class FakeInteraction:
+    """コマンドハンドラが参照する属性だけを持つ discord.Interaction の代替"""
+
+    def __init__(self, user_id: int, channel_id: int, guild_id: Optional[int],
+                 dispatched_at: float, discord_latency: float):
+        self.user = SimpleNamespace(id=user_id)
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.dispatched_at = dispatched_at
+        self.discord_latency = discord_latency
+        self.acked_at: Optional[float] = None
+        self.followup_at: Optional[float] = None
+        self.deferred = False
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def ack(self, deferred: bool):
+        if self.response.is_done():
+            raise RuntimeError("interaction has already been responded to")
+        self.response._done = True
+        await asyncio.sleep(self.discord_latency)
+        self.acked_at = time.perf_counter()
+        self.deferred = deferred
+
+    @property
+    def time_to_ack(self) -> Optional[float]:
+        if self.acked_at is None:
+            return None
+        return self.acked_at - self.dispatched_at
+
+    @property
+    def missed(self) -> bool:
+        return self.time_to_ack is None or self.time_to_ack > ACK_DEADLINE
+
+    @property
+    def time_to_followup(self) -> Optional[float]:
+        # 期限切れのインタラクションは Discord 側で消えており、follow-up も届かない
+        if self.missed:
+            return None
+        # send_message で即答したコマンドは応答そのものが最終メッセージ
+        done_at = self.followup_at if self.deferred else self.acked_at
+        if done_at is None:
+            return None
+        return done_at - self.dispatched_at
+
+
+def build_arguments(name: str, ticker: str) -> Dict[str, object]:
+    if name in ("about", "cancel", "price"):
+        return {"ticker": ticker}
+    if name in ("alert_above", "alert_below"):
+        return {"ticker": ticker, "price": float(random.randint(500, 2000))}
+    if name == "set":
+        return {"ticker": ticker, "purchase_price": float(random.randint(500, 2000)),
+                "quantity": random.randint(1, 10) * 100}
+    if name == "sell":
+        return {"ticker": ticker, "quantity": 100, "sell_price": float(random.randint(500, 2000))}
+    return {}
+
+
+# ---------------------------------------------------------------------------
+# 負荷試験本体
+# ---------------------------------------------------------------------------
+
+def check_database(database_url: str, allow_remote: bool):
+    """実際に接続し、サーバー側のアドレスがループバックか確認する
+
+    inet_server_addr() は Unix ソケット接続のとき NULL を返す。
+    """
+    conn = psycopg2.connect(database_url)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT inet_server_addr()")
+        server_addr = cur.fetchone()[0]
+        cur.close()
+    finally:
+        conn.close()
+    if server_addr is None or allow_remote:
+        return
+    if not ipaddress.ip_address(str(server_addr).split("/")[0]).is_loopback:
+        raise SystemExit(
+            f"DB サーバー ({server_addr}) がローカルではありません。"
+            "意図したものなら --allow-remote-db を付けてください"
+        )
+
+
+def check_fake_kabutan():
+    """偽 kabutan のページが get_company_info の XPath で読めるか確認する"""
+    info = main.get_company_info("7000.T")
+    main.company_name_cache.clear()
+    if not info or not info["company_name"]:
+        raise SystemExit("偽 kabutan のページから企業名を取得できません（XPath と KABUTAN_PAGE を確認）")
+
+
+def reset_state(use_db: bool, guilds: int):
+    main.alerts.clear()
+    main.alert_id_counter = 1
+    main.company_name_cache.clear()
+    if not use_db:
+        return
+    conn = None
+    cur = None
+    try:
+        conn = main.get_db_connection()
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM portfolio WHERE guild_id >= %s AND guild_id < %s AND guild_id < 0",
+            (LOADTEST_GUILD_BASE, LOADTEST_GUILD_BASE + guilds),
+        )
+        conn.commit()
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            conn.close()
+
+
+async def dispatch(name: str, interaction: FakeInteraction, arguments: Dict[str, object],
+                   errors: List[str]):
+    command = main.tree.get_command(name)
+    try:
+        await command.callback(interaction, **arguments)
+    except Exception as e:
+        errors.append(f"{name}: {e!r}")
+
+
+async def run_stage(rate: float, duration: float, commands: List[str], tickers: List[str],
+                    portfolio_tickers: List[str], users: int, guilds: int,
+                    discord_latency: float) -> Dict[str, object]:
+    """一定レートでインタラクションを投入し、全件の完了を待って結果を返す
+
+    遅延は実際の投入時刻ではなく予定到着時刻から測る。イベントループが同期 I/O で
+    塞がって投入自体が遅れた分も、ユーザーから見た待ち時間として計上するため。
+    """
+    total = max(1, int(rate * duration))
+    interactions: List[FakeInteraction] = []
+    errors: List[str] = []
+    tasks = []
+
+    start = time.perf_counter()
+    for i in range(total):
+        scheduled = start + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        name = random.choice(commands)
+        user_id = random.randint(1, users)
+        interaction = FakeInteraction(
+            user_id=user_id,
+            channel_id=1,
+            guild_id=LOADTEST_GUILD_BASE + user_id % guilds,
+            dispatched_at=scheduled,
+            discord_latency=discord_latency,
+        )
+        interactions.append(interaction)
+        ticker = random.choice(portfolio_tickers if name in DB_COMMANDS else tickers)
+        arguments = build_arguments(name, ticker)
+        tasks.append(asyncio.create_task(dispatch(name, interaction, arguments, errors)))
+    await asyncio.gather(*tasks)
+
+    acks = [ix.time_to_ack for ix in interactions if ix.time_to_ack is not None]
+    followups = [ix.time_to_followup for ix in interactions if ix.time_to_followup is not None]
+    missed = sum(1 for ix in interactions if ix.missed)
+    # 期限内に応答したのに最終メッセージまで届かなかったもの（ハンドラの例外など）
+    lost = sum(1 for ix in interactions if not ix.missed and ix.time_to_followup is None)
+    return {
+        "rate": rate,
+        "total": total,
+        "ack": acks,
+        "followup": followups,
+        "missed": missed,
+        "lost": lost,
+        "errors": errors,
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    # nearest-rank 法
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def format_distribution(values: List[float]) -> str:
+    return " ".join(
+        f"{label}={percentile(values, pct) * 1000:7.0f}ms"
+        for label, pct in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))
+    )
+
+
+def print_stage(result: Dict[str, object]):
+    print(f"rate {result['rate']:g}/s, {result['total']} interactions")
+    print(f"  time-to-ack      {format_distribution(result['ack'])}")
+    print(f"  time-to-followup {format_distribution(result['followup'])}")
+    print(f"  missed deadlines {result['missed']} / {result['total']}"
+          " (excluded from time-to-followup)")
+    print(f"  lost followups   {result['lost']} / {result['total']}")
+    if result["errors"]:
+        print(f"  errors           {len(result['errors'])} (first: {result['errors'][0]})")
+
+
+async def run(args: argparse.Namespace):
+    use_db = bool(args.database_url)
+    commands = [c.strip() for c in args.commands.split(",")] if args.commands else list(BASE_COMMANDS)
+    if not args.commands and use_db:
+        commands += DB_COMMANDS
+    if not use_db and any(c in DB_COMMANDS for c in commands):
+        raise SystemExit("set / show / sell を含める場合は --database-url を指定してください")
+    for name in commands:
+        if main.tree.get_command(name) is None:
+            raise SystemExit(f"未登録のコマンドです: {name}")
+
+    if use_db:
+        check_database(args.database_url, args.allow_remote_db)
+        # parse_args と check_database でローカル（または明示的に許可されたホスト）と確認済み
+        os.environ["DATABASE_URL"] = args.database_url
+        main.ensure_portfolio_schema()
+
+    server = start_fake_kabutan(args.kabutan_latency / 1000)
+    main.KABUTAN_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        check_fake_kabutan()
+    except SystemExit:
+        server.shutdown()
+        raise
+    FakeTicker.latency = args.yfinance_latency / 1000
+    main.yf = SimpleNamespace(Ticker=FakeTicker)
+
+    tickers = [f"{7000 + i}.T" for i in range(args.tickers)]
+    portfolio_tickers = tickers[:args.portfolio_tickers]
+    print(f"commands: {', '.join(commands)}")
+
+    sustainable = None
+    try:
+        for rate in args.rates:
+            reset_state(use_db, args.guilds)
+            result = await run_stage(rate, args.duration, commands, tickers, portfolio_tickers,
+                                     args.users, args.guilds, args.discord_latency / 1000)
+            print_stage(result)
+            if result["missed"] / result["total"] > args.max_miss_ratio:
+                break
+            sustainable = rate
+    finally:
+        server.shutdown()
+
+    if sustainable is None:
+        print("max sustainable rate: none of the tested rates met the deadline")
+    else:
+        print(f"max sustainable rate: {sustainable:g}/s")
+
+
+def remote_db_targets(database_url: str, environ: Dict[str, str]) -> List[str]:
+    """libpq が実際に使う接続先のうち、ローカルと断定できないものを返す
+
+    接続文字列に無い host / hostaddr / service は PG* 環境変数で補われる。
+    service は pg_service.conf 経由で解決されるため中身を問わず拒否する。
+    """
+    dsn = parse_dsn(database_url)
+    service = dsn.get("service") or environ.get("PGSERVICE")
+    if service:
+        return [f"service={service}"]
+    host = dsn.get("host") or environ.get("PGHOST") or ""
+    hostaddr = dsn.get("hostaddr") or environ.get("PGHOSTADDR") or ""
+    targets = [h for h in hostaddr.split(",") if h] or [h for h in host.split(",") if h]
+    return [
+        t for t in targets
+        if t not in LOCAL_DB_HOSTS and not t.startswith("/") and not t.startswith("@")
+    ]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Discord コマンドの同時負荷試験")
+    parser.add_argument("--rates", default="5,10,25,50,100,200,400",
+                        help="投入レート（件/秒）をカンマ区切りで指定（昇順に並べ替えて実行）")
+    parser.add_argument("--duration", type=float, default=10.0, help="各レートの投入時間（秒）")
+    parser.add_argument("--commands", default="", help="対象コマンドをカンマ区切りで指定")
+    parser.add_argument("--tickers", type=int, default=200, help="ランダムに使う銘柄数")
+    parser.add_argument("--portfolio-tickers", type=int, default=5,
+                        help="set / sell でランダムに使う銘柄数（--tickers の先頭から）")
+    parser.add_argument("--users", type=int, default=1000, help="ランダムに使うユーザー数")
+    parser.add_argument("--guilds", type=int, default=100, help="ユーザーを振り分けるサーバー数")
+    parser.add_argument("--kabutan-latency", type=float, default=300.0, help="偽 kabutan の応答遅延（ms）")
+    parser.add_argument("--yfinance-latency", type=float, default=500.0, help="偽 yfinance の応答遅延（ms）")
+    parser.add_argument("--discord-latency", type=float, default=50.0, help="Discord API の往復遅延（ms）")
+    parser.add_argument("--max-miss-ratio", type=float, default=0.01,
+                        help="持続可能とみなす期限超過率の上限")
+    parser.add_argument("--database-url", default=None,
+                        help="ローカル検証用の PostgreSQL 接続文字列")
+    parser.add_argument("--allow-remote-db", action="store_true",
+                        help="ローカル以外のホストの --database-url を許可する")
+    parser.add_argument("--seed", type=int, default=None, help="乱数シード")
+    args = parser.parse_args()
+
+    try:
+        rates = [float(r) for r in args.rates.split(",")]
+    except ValueError:
+        parser.error(f"--rates は数値のカンマ区切りで指定してください: {args.rates!r}")
+    if any(r <= 0 for r in rates):
+        parser.error("--rates には正の値を指定してください")
+    args.rates = sorted(rates)
+
+    for name in ("duration", "tickers", "portfolio_tickers", "users", "guilds"):
+        if getattr(args, name) <= 0:
+            parser.error(f"--{name.replace('_', '-')} には正の値を指定してください")
+    for name in ("kabutan_latency", "yfinance_latency", "discord_latency"):
+        if getattr(args, name) < 0:
+            parser.error(f"--{name.replace('_', '-')} には 0 以上の値を指定してください")
+    if not 0 <= args.max_miss_ratio <= 1:
+        parser.error("--max-miss-ratio は 0 から 1 の範囲で指定してください")
+
+    if args.database_url and not args.allow_remote_db:
+        try:
+            remote = remote_db_targets(args.database_url, os.environ)
+        except psycopg2.Error as e:
+            parser.error(f"--database-url を解釈できません: {e}")
+        if remote:
+            parser.error(
+                f"ローカル以外の DB 接続先 ({', '.join(remote)}) には --allow-remote-db が必要です"
+            )
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args))
@@ -17,6 +17,7 @@ from lxml import html
 from keep_alive import start_server
 
 TOKEN = os.environ.get("DISCORD_BOT_TOKEN")
+KABUTAN_BASE_URL = os.environ.get("KABUTAN_BASE_URL", "https://kabutan.jp")
 
 intents = discord.Intents.default()
 intents.message_content = False
@@ -105,7 +106,7 @@ def get_stock_price_with_change(ticker: str) -> tuple[Optional[float], Optional[
 def get_company_info(ticker: str) -> Optional[Dict[str, str]]:
     """kabutanから企業情報を取得"""
     ticker_code = ticker.replace(".T", "")
-    url = f"https://kabutan.jp/stock/?code={ticker_code}"
+    url = f"{KABUTAN_BASE_URL}/stock/?code={ticker_code}"
 
     try:
         response = requests.get(url, timeout=10)
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+for module in ("discord", "yfinance", "pandas", "psycopg2", "flask", "requests", "lxml"):
+    pytest.importorskip(module)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "discord_stocker"))
+
+import loadtest  # noqa: E402
+import main  # noqa: E402
+
+
+@pytest.fixture
+def fake_kabutan(monkeypatch):
+    server = loadtest.start_fake_kabutan(0)
+    monkeypatch.setattr(main, "KABUTAN_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    yield
+    server.shutdown()
+    main.company_name_cache.clear()
+
+
+def test_fake_kabutan_matches_company_info_xpaths(fake_kabutan):
+    info = main.get_company_info("7203.T")
+    assert info == {
+        "company_name": "7203 テスト株式会社",
+        "business_description": "負荷試験用のダミー事業概要",
+        "company_url": "https://example.com/7203",
+    }
+    loadtest.check_fake_kabutan()
+
+
+def test_check_fake_kabutan_fails_on_xpath_drift(fake_kabutan, monkeypatch):
+    monkeypatch.setattr(loadtest, "KABUTAN_PAGE", "<html><body><p>{code}</p></body></html>")
+    with pytest.raises(SystemExit):
+        loadtest.check_fake_kabutan()
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 51)]
+    assert loadtest.percentile(values, 50) == 25
+    assert loadtest.percentile(values, 90) == 45
+    assert loadtest.percentile(values, 99) == 50
+    assert loadtest.percentile(values, 100) == 50
+    assert loadtest.percentile([7.0], 1) == 7
+
+
+@pytest.mark.parametrize(
+    "database_url, environ, expected",
+    [
+        ("postgresql://localhost/x", {}, []),
+        ("dbname=x", {}, []),
+        ("postgresql://localhost/x?hostaddr=10.0.0.5", {}, ["10.0.0.5"]),
+        ("service=prod", {}, ["service=prod"]),
+        ("dbname=x", {"PGSERVICE": "prod"}, ["service=prod"]),
+        ("dbname=x", {"PGHOST": "db.example.com"}, ["db.example.com"]),
+        ("postgresql://localhost/x", {"PGHOSTADDR": "10.0.0.5"}, ["10.0.0.5"]),
+        ("host=/var/run/postgresql dbname=x", {}, []),
+    ],
+)
+def test_remote_db_targets(database_url, environ, expected):
+    assert loadtest.remote_db_targets(database_url, environ) == expected